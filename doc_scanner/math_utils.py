@@ -21,6 +21,34 @@ def intersection_cartesian(L1: pd.DataFrame, L2: pd.DataFrame):
     return list(zip(x.values.tolist(), y.values.tolist()))
 
 
+def intersection_polar(L1: np.array, L2: np.array):
+    """
+    Compute cartesian coordinates of intersection points between every line in L1 and every line in L2,
+    given lines in polar form. sin and cos are evaluated once per line rather than once per pair.
+    Polar form for a line: x*cos(phi)+y*sin(phi)=rho
+
+    :param L1: line in tuple or array (phi,rho) or a list of lines [(phi_1,rho_1),(phi_2,rho_2),...]
+    :param L2: line in tuple or array (phi,rho) or a list of lines [(phi_1,rho_1),(phi_2,rho_2),...]
+    :return: a list of intersection points [(x1,y1),(x2,y2),...] in the order of itertools.product(L1, L2)
+    """
+    L1 = np.array(L1, dtype=float)
+    L2 = np.array(L2, dtype=float)
+    if L1.size == 0 or L2.size == 0:
+        return list()
+    if L1.shape[-1:] != (2,) or L2.shape[-1:] != (2,) or len(L1.shape) > 2 or len(L2.shape) > 2:
+        raise ValueError("L1 and L2 should be matrix with column size of exactly 2")
+    L1 = L1.reshape(-1, 2)
+    L2 = L2.reshape(-1, 2)
+
+    sin1, cos1, rho1 = np.sin(L1[:, 0, None]), np.cos(L1[:, 0, None]), L1[:, 1, None]
+    sin2, cos2, rho2 = np.sin(L2[:, 0]), np.cos(L2[:, 0]), L2[:, 1]
+    # sin(phi2 - phi1)
+    d = sin2 * cos1 - cos2 * sin1
+    x = (rho1 * sin2 - rho2 * sin1) / d
+    y = (rho2 * cos1 - rho1 * cos2) / d
+    return list(zip(x.ravel().tolist(), y.ravel().tolist()))
+
+
 def points2line(p1, p2):
     """
     Compute Ax+By+C=0 given a list of point [(x1,y1)] and [(x2,y2)].
@@ -31,7 +59,7 @@ def points2line(p1, p2):
     """
     p1 = np.array(p1)
     p2 = np.array(p2)
-    if p1.dtype == np.object or p2.dtype == np.object:
+    if p1.dtype == object or p2.dtype == object:
         raise ValueError("p1 and p2 should matrix alike")
     elif len(p1.shape) == 2 and len(p2.shape) == 2:
         if p1.shape[1] != 2 or p2.shape[1] != 2:
@@ -58,7 +86,7 @@ def find_y_on_lines(lines: np.array, x: np.array):
     if len(lines) == 0:
         return lines
     lines = np.array(lines)
-    if lines.dtype == np.object:
+    if lines.dtype == object:
         raise ValueError("lines should be matrix alike")
     elif len(lines.shape) == 1:
         if len(lines) == 2:
@@ -72,7 +100,7 @@ def find_y_on_lines(lines: np.array, x: np.array):
         raise ValueError("Invalid lines")
 
     x = np.array(x)
-    if x.dtype == np.object:
+    if x.dtype == object:
         raise ValueError("x should be matrix alike")
     rho = lines[:, 1].reshape(-1, 1)
     phi = lines[:, 0].reshape(-1, 1)
@@ -80,6 +108,24 @@ def find_y_on_lines(lines: np.array, x: np.array):
     return y
 
 
+def find_x_on_lines(lines: np.array, y: np.array):
+    """
+    find x of a list of y on a list of lines that in polar form.
+    Unlike find_y_on_lines, this is well defined for vertical lines (phi == 0).
+    :param lines: line in tuple or array (phi,rho) or a list of lines [(phi_1,rho_1),(phi_2,rho_2),...]
+    :param y:
+    :return: x of points, 1th dimension for different lines and 2th dimension for different y
+    """
+    lines = np.array(lines, dtype=float)
+    if lines.shape[-1:] != (2,) or len(lines.shape) > 2:
+        raise ValueError("lines should be matrix with column size of exactly 2")
+    lines = lines.reshape(-1, 2)
+    rho = lines[:, 1].reshape(-1, 1)
+    phi = lines[:, 0].reshape(-1, 1)
+    x = (rho - np.array(y) * np.sin(phi)) / np.cos(phi)
+    return x
+
+
 def find_points_on_lines(lines: np.array, x: np.array):
     """
     find points of a list of x on a list of lines that in polar form.
@@ -97,13 +143,11 @@ def find_points_on_lines(lines: np.array, x: np.array):
     x = np.array(x)
 
     y = find_y_on_lines(lines, x)
-    points = list()
-    for ix in range(len(x)):
-        points_on_a_line = np.zeros((len(lines), 2))
-        points_on_a_line[:, 0] = x[ix]
-        points_on_a_line[:, 1] = y[:, ix]
-        points.append(list(map(lambda x: tuple(x), points_on_a_line.tolist())))
-    return points
+    # points[x][line] = (x, y)
+    points = np.empty((len(x), len(lines), 2))
+    points[:, :, 0] = x.reshape(-1, 1)
+    points[:, :, 1] = y.T
+    return [list(map(tuple, points_on_a_line)) for points_on_a_line in points.tolist()]
 
 
 def interpolate_pixels_along_line(p1: np.array or tuple, p2: np.array or tuple, width=2):
@@ -149,6 +193,8 @@ def interpolate_pixels_along_line(p1: np.array or tuple, p2: np.array or tuple,
 
     dx = x2 - x1
     dy = y2 - y1
+    if dx == 0 and dy == 0:
+        raise ValueError("p1 and p2 must be different points")
     gradient = dy / dx  # slope
 
     # Get the first given coordinate and add it to the return list
@@ -169,21 +215,25 @@ def interpolate_pixels_along_line(p1: np.array or tuple, p2: np.array or tuple,
     xpxl1 = x_end
     ypxl1 = np.round(y_end)
 
-    # Loop between the first x coordinate and the second x coordinate, interpolating the y coordinates
-    for x in np.arange(xpxl0 + 1, xpxl1):
-        if steep:
-            pixels.extend([(np.floor(interpolated_y) + i, x) for i in range(1 - width, width + 1)])
-
-        else:
-            pixels.extend([(x, np.floor(interpolated_y) + i) for i in range(1 - width, width + 1)])
-
-        interpolated_y += gradient
+    # Interpolate the y coordinates between the first x coordinate and the second x coordinate.
+    # The gradient is accumulated with cumsum, which adds it up step by step in the same order as a loop would.
+    xs = np.arange(xpxl0 + 1, xpxl1)
+    steps = np.full(len(xs), gradient)
+    steps[:1] = interpolated_y
+    ys = np.floor(np.cumsum(steps))
+    offsets = np.arange(1 - width, width + 1)
+    between = np.empty((len(xs), len(offsets), 2))
+    between[:, :, 0] = xs.reshape(-1, 1)
+    between[:, :, 1] = ys.reshape(-1, 1) + offsets
+    if steep:
+        between = between[:, :, ::-1]
 
     # Add the second given coordinate to the given list
     if steep:
-        pixels.extend([(ypxl1, xpxl1), (ypxl1 + 1, xpxl1)])
+        last = [(ypxl1, xpxl1), (ypxl1 + 1, xpxl1)]
     else:
-        pixels.extend([(xpxl1, ypxl1), (xpxl1, ypxl1 + 1)])
+        last = [(xpxl1, ypxl1), (xpxl1, ypxl1 + 1)]
 
     # convert to int
-    return list(map(lambda x: tuple(x), np.array(pixels, dtype=np.int)))
+    pixels = np.concatenate((np.array(pixels), between.reshape(-1, 2), np.array(last))).astype(int)
+    return list(map(tuple, pixels.tolist()))
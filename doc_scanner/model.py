@@ -1,6 +1,6 @@
 import numpy as np
 from functools import total_ordering
-from doc_scanner.math_utils import interpolate_pixels_along_line, find_points_on_lines
+from doc_scanner.math_utils import interpolate_pixels_along_line, find_points_on_lines, find_x_on_lines
 
 
 class Intersection:
@@ -45,8 +45,11 @@ class Intersection:
         # get a list of points on horizontal edges
         p_h = list(map(lambda x: tuple(x), np.array(p_h).reshape(-1, 2)))
 
-        p_v = find_points_on_lines(self.line_v, x)
-        p_v = list(map(lambda x: tuple(x), np.array(p_v).reshape(-1, 2)))
+        # get a list of points on vertical edges, sampled at given y rather than x since y is not defined on x for a
+        # perfectly vertical line (phi == 0). The x range is reused as y range: connectivity only takes the direction
+        # from the intersection towards each corner, so any two y values on either side of the intersection will do
+        y_range = np.array(x)
+        p_v = list(zip(find_x_on_lines(self.line_v, y_range).ravel().tolist(), y_range.tolist()))
 
         # points[point][0:x,1:y]
         if p_h[0][0] < p_h[1][0]:
@@ -78,25 +81,23 @@ class Intersection:
             hits = [0] * 4
             longth = [0] * 4
             ends = [0] * 4
+            image_height, image_width = self.image.shape[0:2]
             for ix, point in enumerate(self.corners):
                 point = np.array(point).reshape(1, 2)
                 intersection = np.array(self.intersection).reshape(1, 2)
                 # l2 norm (euclidean distance) of difference
                 distance = np.linalg.norm(point - intersection)
                 ratio = self.along_length / distance
-                ends[ix] = np.round((1 - ratio) * intersection + ratio * point).astype(np.int)
-                pixels = interpolate_pixels_along_line(intersection, ends[ix], self.width)
+                ends[ix] = np.round((1 - ratio) * intersection + ratio * point).astype(int)
+                pixels = np.array(interpolate_pixels_along_line(intersection, ends[ix], self.width)).reshape(-1, 2)
 
                 # calculate the numbers of pixels that is not 0 in contour mask
-                # and that is within the contour mask image
-                for pixel in pixels:
-                    try:
-                        if self.image[pixel[1], pixel[0]] > 0:
-                            hits[ix] += 1
-                        longth[ix] += 1
-                    except IndexError:
-                        # TODO when pixels within image are rare, this may introduce false connectivity
-                        pass
+                # and that is within the contour mask image (i.e. can be indexed without IndexError)
+                # TODO when pixels within image are rare, this may introduce false connectivity
+                within_x = (pixels[:, 0] >= -image_width) & (pixels[:, 0] < image_width)
+                within = within_x & (pixels[:, 1] >= -image_height) & (pixels[:, 1] < image_height)
+                hits[ix] = int(np.count_nonzero(self.image[pixels[within, 1], pixels[within, 0]] > 0))
+                longth[ix] = int(np.count_nonzero(within))
             self.hits = hits
             self.longth = longth
             self.ends = ends
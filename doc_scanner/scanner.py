@@ -1,11 +1,27 @@
 import cv2
 import numpy as np
 import itertools
-from skimage.transform import hough_line_peaks, hough_line
-from doc_scanner.math_utils import points2line, find_y_on_lines, intersection_cartesian, find_points_on_lines
+from doc_scanner.math_utils import find_y_on_lines, intersection_polar
 from doc_scanner.model import Intersection, Frame
 from doc_scanner.transform import four_point_transform
 
+# resolution of angles sampled by hough line transform
+THETA_STEP = np.pi / 180
+
+
+def _pyramid_median_blur(image, ksize, levels=2):
+    """Approximate a median filter of size ksize by filtering an image downsampled by 2**levels with a
+    proportionally smaller kernel, then upsampling the result back to the original size.
+    """
+    shapes = list()
+    for _ in range(levels):
+        shapes.append(image.shape[1::-1])
+        image = cv2.pyrDown(image)
+    image = cv2.medianBlur(image, max((ksize >> levels) | 1, 3))
+    for shape in reversed(shapes):
+        image = cv2.pyrUp(image, dstsize=shape)
+    return image
+
 
 class scanner:
     def __init__(self, image: np.array):
@@ -22,7 +38,8 @@ class scanner:
         # return self.warp()
 
     def preprocess(self, kernel_size=15, intensity_lower=0, intensity_upper=255, canny_lower=10, canny_upper=70,
-                   erode_ks=3, dilate_ks=15):
+                   erode_ks=3, dilate_ks=15, roi_margin=5, pyramid_blur_size=None, keep_blurred=False,
+                   l2_gradient=True):
         """Filter and edge detection given a 2D digital image array
         1. Blur
         1. Histogram equalization
@@ -40,98 +57,156 @@ class scanner:
         :param canny_lower:
         :param canny_upper:
         :param erode_ks:
+        :param roi_margin: margin in pixels around the non-zero region of filtered image to run edge detection on
+        :param pyramid_blur_size: if set, images whose shorter side is at least this size are median blurred on an
+            image pyramid, which is much faster than a large median filter on the full image but only approximates
+            it and can miss documents that the exact median finds
+        :param keep_blurred: keep the blurred image as self.blurred for inspection, otherwise it is set to None
+        :param l2_gradient: use L2 norm of image gradient in canny edge detector, otherwise the cheaper L1 norm, which
+            keeps more diagonal edges under the same canny thresholds and can produce false frames
         :return:
         """
-        # self.blurred = cv2.GaussianBlur(image, (5, 5), 0)
-        # self.blurred = cv2.bilateralFilter(image, 9, 50, 50)
-        self.blurred = cv2.medianBlur(self.image, 25)
-        self.hist_equalized = cv2.equalizeHist(self.blurred)
+        # blurred = cv2.GaussianBlur(image, (5, 5), 0)
+        # blurred = cv2.bilateralFilter(image, 9, 50, 50)
+        if pyramid_blur_size is not None and min(self.image.shape) >= pyramid_blur_size:
+            blurred = _pyramid_median_blur(self.image, 25)
+        else:
+            blurred = cv2.medianBlur(self.image, 25)
+        self.blurred = blurred if keep_blurred else None
+        # With OpenCL available, equalization and morphology run on the device through OpenCV transparent API
+        hist_equalized = cv2.UMat(blurred) if cv2.ocl.useOpenCL() else blurred
+        hist_equalized = cv2.equalizeHist(hist_equalized)
 
         # Morphological Open operation
         # Determine kernel size according to a priori knowledge on the size of words
-        kernel = np.ones((kernel_size, kernel_size), dtype=np.int8)
-        self.hist_equalized = cv2.morphologyEx(self.hist_equalized, cv2.MORPH_OPEN, kernel)
-        self.hist_equalized = cv2.morphologyEx(self.hist_equalized, cv2.MORPH_CLOSE, kernel)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_size, kernel_size))
+        if kernel_size % 2 == 1:
+            # Opening followed by closing is erode -> dilate -> dilate -> erode. With an odd rectangle kernel the
+            # anchor is centered, so two dilations equal one dilation with a centered rectangle kernel of size 2k-1
+            kernel_double = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * kernel_size - 1, 2 * kernel_size - 1))
+            hist_equalized = cv2.erode(hist_equalized, kernel)
+            hist_equalized = cv2.dilate(hist_equalized, kernel_double)
+            hist_equalized = cv2.erode(hist_equalized, kernel)
+        else:
+            # An even kernel has an off-center anchor, and the fused passes would shift the result
+            hist_equalized = cv2.morphologyEx(hist_equalized, cv2.MORPH_OPEN, kernel)
+            hist_equalized = cv2.morphologyEx(hist_equalized, cv2.MORPH_CLOSE, kernel)
+        self.hist_equalized = hist_equalized.get() if isinstance(hist_equalized, cv2.UMat) else hist_equalized
 
-        # hist = cv2.calcHist([self.hist_equalized], [0], None, [256], [0, 256])
-        # plt.bar(np.arange(len(hist)), hist.flatten())
+        # Histogram is computed on access of self.hist only
+        # plt.bar(np.arange(len(self.hist)), self.hist.flatten())
         # plt.show()
 
         # TODO blur darker part and dim bright part
         # TODO intensity threshold filter can bring artifacts
         # Threshold the intensity image or gray scale image
-        # ret, thresh = cv2.threshold(imgray, 127, 255, 0)
-        mask = cv2.inRange(self.hist_equalized, intensity_lower, intensity_upper)
-
-        # Bitwise-AND mask and original image
-        self.filterred = cv2.bitwise_and(self.hist_equalized, self.hist_equalized, mask=mask)
+        # Keep intensities within [intensity_lower, intensity_upper] and set the others to 0
+        self.filterred = self.hist_equalized
+        if intensity_lower > 0:
+            _, self.filterred = cv2.threshold(self.filterred, intensity_lower - 1, 255, cv2.THRESH_TOZERO)
+        if intensity_upper < 255:
+            _, self.filterred = cv2.threshold(self.filterred, intensity_upper, 255, cv2.THRESH_TOZERO_INV)
 
         # TODO decide canny thresholds
         # TODO use hough line transform instead of canny edge detector
-        edges = cv2.Canny(self.filterred, canny_lower, canny_upper, L2gradient=True, apertureSize=3)
-        contours, _ = cv2.findContours(edges.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        self.edges_img = cv2.drawContours(np.zeros(self.image.shape[0:2]), contours, -1, (128, 255, 0), 3)
+        # Only look for edges around the region that survives filtering. The margin keeps the dark border around
+        # the region so that its boundary is still detected as edges.
+        x, y, w, h = cv2.boundingRect(self.filterred)
+        x0, y0 = max(x - roi_margin, 0), max(y - roi_margin, 0)
+        x1, y1 = x + w + roi_margin, y + h + roi_margin
+        # L1 gradient magnitude |gx|+|gy| is cheaper than L2, but it is up to sqrt(2) times larger on diagonal edges.
+        # The extra edges it lets through cost more in hough transform than L1 saves, so L2 is the default
+        edges = cv2.Canny(self.filterred[y0:y1, x0:x1], canny_lower, canny_upper, L2gradient=l2_gradient,
+                          apertureSize=3)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x0, y0))
+        # Hough line transform is not fed with canny edges directly: keeping outer contours only, drawing them thick
+        # and eroding them afterwards drops text and jagged edges, which would otherwise produce false lines.
+        # binary uint8 canvas, the thickness of contour is required by the erosion below
+        self.edges_img = cv2.drawContours(np.zeros(self.image.shape[0:2], dtype=np.uint8), contours, -1, 255, 3)
         # -------------------- Dilation --------------------
-        kernel = np.ones((dilate_ks, dilate_ks), dtype=np.int8)
-        self.edges_img_dilated = cv2.morphologyEx(self.edges_img, cv2.MORPH_DILATE, kernel)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (dilate_ks, dilate_ks))
+        self.edges_img_dilated = cv2.dilate(self.edges_img, kernel)
         # -------------------- Erosion --------------------
         # TODO Kernel shape
-        kernel = np.ones((erode_ks, erode_ks), dtype=np.int8)
-        self.edges_img = cv2.morphologyEx(self.edges_img, cv2.MORPH_ERODE, kernel)
-
-    def hough_transform(self, err=np.pi * 1 / 12, threshold=0.49, ks=3):
-        # -------------------- scikit-image hough line transform --------------------
-        theta = np.linspace(-np.pi * 1 / 4, np.pi * 3 / 4, 180)
-        h, theta, distance = hough_line(self.edges_img, theta)
-        hits, phi, rho = hough_line_peaks(h, theta, distance, min_distance=10, min_angle=50,
-                                          threshold=threshold * h.max(),
-                                          num_peaks=np.inf)
-        lines = list(zip(phi, rho))
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (erode_ks, erode_ks))
+        self.edges_img = cv2.erode(self.edges_img, kernel)
+
+    @property
+    def hist(self):
+        """Intensity histogram of the histogram equalized image, computed on access"""
+        return cv2.calcHist([self.hist_equalized], [0], None, [256], [0, 256])
+
+    def hough_transform(self, err=np.pi * 1 / 12, threshold=0.49, min_distance=10, min_angle=50, ks=3):
+        """Detect straight lines with OpenCV hough line transform and divide them by orientation
+
+        Peaks are selected like scikit-image hough_line_peaks: a line is a candidate only if no line with more votes
+        lies within min_distance (in pixels) and min_angle (in steps of theta) of it, and candidates are accepted in
+        descending order of votes unless an accepted peak lies within the same neighbourhood.
+
+        :param err: angle tolerance to decide whether a line is vertical or horizontal
+        :param threshold: minimum votes of a line relative to the strongest line within err of vertical or horizontal.
+            Diagonal lines are not voted, so a strong diagonal line does not raise the cutoff as it would if the
+            strongest line over all angles were taken
+        :param min_distance:
+        :param min_angle:
+        :return:
+        """
         # -------------------- OpenCV hough line transform --------------------
-        # lines = cv2.HoughLines(self.edges_img.astype(np.uint8), 1, np.pi / 180, threshold).reshape(-1, 2)
-        # lines = list(map(lambda x: tuple(x), lines[:, ::-1].tolist()))
+        # Only lines within err of vertical or horizontal are of interest, so only angles around 0 and pi/2 are voted.
+        # The grid is shifted by half a step so that no angle falls exactly on 0 or pi/2, where sin or cos vanishes
+        bands = list()
+        for center in (0, np.pi / 2):
+            band = cv2.HoughLinesWithAccumulator(self.edges_img, 1, THETA_STEP, 1,
+                                                 min_theta=center - err + THETA_STEP / 2, max_theta=center + err)
+            if band is not None:
+                bands.append(band.reshape(-1, 3))
+        # each row is (rho, phi, votes), sorted in descending order of votes
+        lines = np.concatenate(bands) if bands else np.zeros((0, 3))
+        lines = lines[np.argsort(-lines[:, 2], kind='stable')]
+        lines = lines[lines[:, 2] >= threshold * lines[:, 2].max(initial=0)]
+
+        # neighbour[i, j]: line j lies within min_distance and min_angle of line i
+        close_rho = np.abs(lines[:, 0, None] - lines[:, 0]) <= min_distance
+        close_phi = np.abs(lines[:, 1, None] - lines[:, 1]) <= min_angle * THETA_STEP
+        neighbour = close_rho & close_phi
+        # only local maximums are candidates of peaks
+        local_max = ~(neighbour & (lines[:, 2] > lines[:, 2, None])).any(axis=1)
+        peaks = list()
+        for ix in np.flatnonzero(local_max):
+            if not neighbour[ix, peaks].any():
+                peaks.append(ix)
+        rho, phi = lines[peaks, 0:2].T
+        lines = np.column_stack((phi, rho))
 
         # -------------------- discriminate between vertical and horizontal lines --------------------
-        self.lines = dict(v=[], h=[], o=[])
-        for ix, (phi, _) in enumerate(lines):
-            if abs(phi) < err or abs(phi - np.pi) < err:
-                # vertical
-                self.lines['v'].append(lines[ix])
-            elif abs(phi - np.pi / 2) < err:
-                # horizontal
-                self.lines['h'].append(lines[ix])
-            else:
-                # irrelevant lines
-                self.lines['o'].append(lines[ix])
+        # v: vertical, h: horizontal, o: irrelevant lines
+        direction = np.select([(np.abs(phi) < err) | (np.abs(phi - np.pi) < err), np.abs(phi - np.pi / 2) < err],
+                              ['v', 'h'], default='o')
+        self.lines = dict()
+        for orientation in ('v', 'h', 'o'):
+            self.lines[orientation] = list(map(tuple, lines[direction == orientation]))
         return self.lines
 
     def calc_intersections(self):
-        """ Compute connectivity given a horizontal line and vertical line in polar coordination.
-        1. convert lines to cartesian coordination
-        2. find intersection in cartesian coordination
-        3.
+        """ Compute intersections given a horizontal line and vertical line in polar coordination.
+        Every pair of vertical and horizontal lines is solved at once in closed form.
 
         :return:
         """
-        combinations = list(itertools.product(self.lines['v'], self.lines['h']))
-        if len(combinations) == 0:
+        lines_v, lines_h = self.lines['v'], self.lines['h']
+        if len(lines_v) == 0 or len(lines_h) == 0:
             self.intersections = list()
             return self.intersections
 
-        pairs = np.array(combinations)
-        lines_h = pairs[:, 0, :]
-        lines_v = pairs[:, 1, :]
-
         x = (0, self.edges_img.shape[1])
 
-        points_h = find_points_on_lines(lines_h, x)
-        points_v = find_points_on_lines(lines_v, x)
-
-        cross = intersection_cartesian(points2line(*points_h), points2line(*points_v))
+        cross = intersection_polar(lines_v, lines_h)
+        # indices of vertical and horizontal line of every intersection, in the same order as cross
+        ix_v, ix_h = np.meshgrid(np.arange(len(lines_v)), np.arange(len(lines_h)), indexing='ij')
 
         self.intersections = list()
-        for ix in range(len(combinations)):
-            self.intersections.append(Intersection(cross[ix], *combinations[ix], x=x))
+        for point, iv, ih in zip(cross, ix_v.ravel().tolist(), ix_h.ravel().tolist()):
+            self.intersections.append(Intersection(point, lines_v[iv], lines_h[ih], x=x))
         return self.intersections
 
     def calc_connectivity(self):
@@ -206,6 +281,8 @@ class scanner:
     def plot_lines(self, ax):
         x = (0, self.image.shape[1])
         for orientation, lines in self.lines.items():
+            if len(lines) == 0:
+                continue
             y = find_y_on_lines(lines, x)
             if orientation == 'v':
                 color = 'r'
@@ -213,8 +290,8 @@ class scanner:
                 color = 'g'
             else:
                 color = 'k'
-            for _y in y:
-                ax.plot(x, _y, '-{}'.format(color))
+            # every column of y.T is plotted as a line
+            ax.plot(x, y.T, '-{}'.format(color))
 
     def focus_on_intersection(self, intersection: Intersection, ax, size=50):
         """Zoom in to have a close look on given intersection
@@ -1,6 +1,7 @@
 import os
 import pathlib
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 import numpy as np
@@ -68,6 +69,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--from_dir", dest='from_dir', default='./data')
     parser.add_argument("--to_dir", dest='to_dir', default='./output')
+    parser.add_argument("--workers", dest='workers', type=int, default=os.cpu_count())
     args = parser.parse_args()
 
     success_dir = os.path.join(args.to_dir, 'success')
@@ -76,19 +78,29 @@ if __name__ == "__main__":
     pathlib.Path(success_dir).mkdir(parents=True, exist_ok=True)
     pathlib.Path(fail_dir).mkdir(parents=True, exist_ok=True)
 
-    files = os.listdir(args.from_dir)
-    for i, file in enumerate(files):
+    files = list()
+    for file in os.listdir(args.from_dir):
         filepath = os.path.join(args.from_dir, file)
         if os.path.isdir(filepath):
             continue
         else:
             if not filepath.endswith('jpg'):
                 continue
-        ok, result = scan(filepath)
+        files.append(file)
+
+    def scan_and_save(file):
+        ok, result = scan(os.path.join(args.from_dir, file))
 
         if ok:
             path = os.path.join(success_dir, file)
         else:
             path = os.path.join(fail_dir, file)
         cv2.imwrite(path, result)
-        print(f"{i}/{len(files)}", end='\r', flush=True)
+
+    # Scan images in parallel, one image per thread. OpenCV is limited to a single thread per call to avoid
+    # oversubscribing cores with its own internal parallelism.
+    if args.workers > 1:
+        cv2.setNumThreads(1)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for i, _ in enumerate(executor.map(scan_and_save, files)):
+            print(f"{i + 1}/{len(files)}", end='\r', flush=True)
@@ -29,7 +29,7 @@ setuptools.setup(
     version=__version__,
     author="Guoli Lyu",
     author_email="guoli-lyu@outlook.com",
-    description="A document scanner based on openCV3 and scikit-image",
+    description="A document scanner based on openCV",
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/Guoli-Lyu/document-scanner",
@@ -45,7 +45,6 @@ setuptools.setup(
     },
     install_requires=[
         'numpy',
-        'scikit-image',
         'opencv-python',
         'pandas',
     ],
@@ -55,6 +55,30 @@ def test_points2line_invalid_input():
         math_utils.points2line(p1, p2)
 
 
+def test_intersection_polar():
+    # x=10 and x+y=2 crossing y=20 and y=0
+    L1 = [(0, 10), (np.pi / 4, np.sqrt(2))]
+    L2 = [(np.pi / 2, 20), (np.pi / 2, 0)]
+    result = [(10, 20), (10, 0), (-18, 20), (2, 0)]
+
+    cross = math_utils.intersection_polar(L1, L2)
+    assert np.allclose(cross, result)
+
+    cross = math_utils.intersection_polar((0, 10), (np.pi / 2, 20))
+    assert np.allclose(cross, [(10, 20)])
+
+    assert math_utils.intersection_polar([], L2) == []
+    assert math_utils.intersection_polar(L1, []) == []
+
+
+def test_intersection_polar_invalid_input():
+    with pytest.raises(ValueError):
+        math_utils.intersection_polar((0, 10, 0), (np.pi / 2, 20))
+
+    with pytest.raises(ValueError):
+        math_utils.intersection_polar([[(0, 10)]], [(np.pi / 2, 20)])
+
+
 def test_find_y_on_lines():
     x = (0, 100)
     lines = [(np.pi / 2, 10), (np.pi / 4, np.sqrt(2)), ]
@@ -93,6 +117,20 @@ def test_find_y_on_lines_invalid():
         math_utils.find_y_on_lines(line, ((0, 10, 0), (1, 0)))
 
 
+def test_find_x_on_lines():
+    y = (0, 100)
+    # vertical line x=10 and x+y=2
+    lines = [(0.0, 10), (np.pi / 4, np.sqrt(2))]
+    result = np.array([[10, 10], [2.0, -98.0]])
+
+    x = math_utils.find_x_on_lines(lines, y)
+    assert np.allclose(x, result)
+    assert np.isfinite(x).all()
+
+    with pytest.raises(ValueError):
+        math_utils.find_x_on_lines((0.0, 10, 10), y)
+
+
 def test_find_points_on_lines():
     x = (0, 100)
     lines = [(np.pi / 2, 10), (np.pi / 4, np.sqrt(2)), ]
@@ -120,3 +158,11 @@ def test_interpolate_pixels_along_line():
               (7, 3), (7, 4)]
     pixels = math_utils.interpolate_pixels_along_line((0, 0), (7, 3), width=2)
     assert pixels == result
+
+
+def test_interpolate_pixels_along_line_same_points():
+    with pytest.raises(ValueError):
+        math_utils.interpolate_pixels_along_line((3, 4), (3, 4))
+
+    with pytest.raises(ValueError):
+        math_utils.interpolate_pixels_along_line(np.array((3.2, 4.0)), np.array((3.2, 4.0)))
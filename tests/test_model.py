@@ -0,0 +1,18 @@
+from doc_scanner.model import Intersection
+import numpy as np
+
+
+def test_intersection_vertical_line():
+    # perfectly vertical line x=10 crossing horizontal line y=20
+    intersection = Intersection((10, 20), (0.0, 10), (np.pi / 2, 20), x=(0, 100))
+    top, right, bottom, left = intersection.corners
+    assert np.isfinite(intersection.corners).all()
+    assert np.allclose([top, bottom], [(10, 100), (10, 0)])
+    assert np.allclose([right, left], [(100, 20), (0, 20)])
+
+    intersection.image = np.zeros((100, 100), dtype=np.uint8)
+    intersection.image[:, 5:16] = 255
+    intersection.image[15:26, :] = 255
+    connectivity = intersection.connectivity()
+    assert all(length > 2 for length in intersection.longth)
+    assert np.allclose(connectivity, 1)
@@ -0,0 +1,20 @@
+from doc_scanner.scanner import scanner
+import numpy as np
+
+
+def test_scan_blank_image():
+    s = scanner(np.zeros((200, 300), dtype=np.uint8))
+    s.scan()
+    assert s.lines == {'v': [], 'h': [], 'o': []}
+    assert s.intersections == []
+    assert s.corners is None
+
+
+def test_scan_horizontal_edge_only():
+    image = np.zeros((200, 300), dtype=np.uint8)
+    image[100:, :] = 255
+    s = scanner(image)
+    s.scan()
+    assert s.lines['v'] == []
+    assert s.intersections == []
+    assert s.corners is None